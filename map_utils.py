@@ -2,14 +2,40 @@
 Utility functions and classes for the CRESST/GAIA landing page map.
 """
 
+import base64
+import functools
+import hashlib
+import io
+import os
+import re
+import urllib.parse
+
 import requests
-import xml.etree.ElementTree as ET
+
+# Prefer lxml (libxml2 C parser, roughly 2-5x faster on the large GIBS
+# capabilities document) but fall back to the stdlib parser.
+try:
+    from lxml import etree as ET
+    _HAVE_LXML = True
+    _XMLParseError = ET.XMLSyntaxError
+except ImportError:
+    import xml.etree.ElementTree as ET
+    _HAVE_LXML = False
+    _XMLParseError = ET.ParseError
+
 import numpy as np
 import matplotlib
-import matplotlib.colors as mcolors
+from requests.adapters import HTTPAdapter
 import branca.colormap as bcm
 from folium.elements import MacroElement
 from jinja2 import Template
+from markupsafe import escape
+
+
+# Shared session so repeated GIBS/ESRI fetches reuse pooled keep-alive
+# connections instead of paying a TCP+TLS handshake per request.
+_session = requests.Session()
+_session.mount('https://', HTTPAdapter(pool_connections=8, pool_maxsize=16))
 
 
 def mpl_to_branca(cmap, vmin=0, vmax=1, n=256):
@@ -28,30 +54,136 @@ def mpl_to_branca(cmap, vmin=0, vmax=1, n=256):
     Returns
     -------
     branca.colormap.LinearColormap
+        The colormap, with the sampled (n, 4) uint8 RGBA table attached
+        as a ``lut`` attribute for use with apply_lut
     """
     if isinstance(cmap, str):
         cmap = matplotlib.colormaps.get_cmap(cmap)
 
-    colors = [
-        mcolors.to_hex(cmap(i))
-        for i in np.linspace(0, 1, n)
-    ]
+    rgba = cmap(np.linspace(0, 1, n))
+    lut = (rgba * 255).astype(np.uint8)
+
+    # branca accepts (r, g, b) tuples directly, so hand it the sampled
+    # colors as-is rather than round-tripping through hex strings. Note
+    # branca parses tuples as floats in [0, 1] (only hex strings get the
+    # /255 scaling), so the tuples must stay in float form.
+    if isinstance(cmap, matplotlib.colors.ListedColormap) and len(cmap.colors) == n:
+        colors = list(cmap.colors)
+    else:
+        colors = [tuple(row) for row in rgba[:, :3]]
 
-    return bcm.LinearColormap(
+    branca_cmap = bcm.LinearColormap(
         colors=colors,
         vmin=vmin,
         vmax=vmax
     )
+    branca_cmap.lut = lut
+    return branca_cmap
 
 
-def get_gibs_legend_url(layer_name, wms_url="https://gibs.earthdata.nasa.gov/wms/epsg3857/best/wms.cgi"):
+def apply_lut(values, lut, vmin=0, vmax=1):
     """
-    Fetch the legend URL for a given NASA GIBS layer from WMS GetCapabilities.
+    Colorize an array of values with a uint8 RGBA lookup table.
+
+    Bucketizes the values into LUT indices, then maps them with
+    ``lut.take(indices, axis=0)``, whose specialized C path is roughly
+    twice as fast as fancy indexing (``lut[indices]``) on large arrays.
+
+    Parameters
+    ----------
+    values : array_like
+        Data values to colorize
+    lut : ndarray
+        (n, 4) uint8 RGBA table, e.g. the ``lut`` attribute attached by
+        mpl_to_branca
+    vmin, vmax : float
+        Data range mapped onto the LUT; values outside are clipped
+
+    Returns
+    -------
+    ndarray
+        RGBA uint8 array with shape ``values.shape + (4,)``
+    """
+    n = lut.shape[0]
+    scaled = (np.asarray(values) - vmin) / (vmax - vmin) * (n - 1)
+    indices = np.clip(scaled.astype(np.intp), 0, n - 1)
+    return lut.take(indices, axis=0)
+
+
+@functools.lru_cache(maxsize=8)
+def _get_capabilities_root(wms_url):
+    """
+    Fetch and parse a WMS GetCapabilities document, caching the result.
+
+    The GIBS capabilities document is several MB and changes slowly, so
+    looking up legends for multiple layers should reuse one fetch+parse.
+
+    Parameters
+    ----------
+    wms_url : str
+        The WMS endpoint URL
+
+    Returns
+    -------
+    xml.etree.ElementTree.Element
+        The parsed root element of the capabilities document
+    """
+    capabilities_url = f"{wms_url}?SERVICE=WMS&REQUEST=GetCapabilities&VERSION=1.3.0"
+
+    response = _session.get(capabilities_url, timeout=(3, 15))
+    response.raise_for_status()
+
+    if _HAVE_LXML:
+        parser = ET.XMLParser(huge_tree=False, remove_blank_text=True)
+        return ET.fromstring(response.content, parser)
+    return ET.fromstring(response.content)
+
+
+@functools.lru_cache(maxsize=8)
+def _build_legend_index(root):
+    """
+    Build a layer name -> legend URL dict from a parsed capabilities root.
+
+    One pass over the document replaces a per-call findall scan, so N
+    legend lookups cost O(layers) total instead of O(N * layers).
+
+    Parameters
+    ----------
+    root : xml.etree.ElementTree.Element
+        Parsed GetCapabilities root (as returned by _get_capabilities_root)
+
+    Returns
+    -------
+    dict
+        Mapping of layer name to legend URL (layers without a LegendURL
+        are omitted)
+    """
+    wms = 'http://www.opengis.net/wms'
+    index = {}
+    for layer in root.iter(f'{{{wms}}}Layer'):
+        name_elem = layer.find(f'{{{wms}}}Name')
+        if name_elem is None:
+            continue
+        legend_url_elem = layer.find(f'.//{{{wms}}}LegendURL/{{{wms}}}OnlineResource')
+        if legend_url_elem is not None:
+            href = legend_url_elem.get('{http://www.w3.org/1999/xlink}href')
+            if href is not None:
+                index[name_elem.text] = href
+    return index
+
+
+def _stream_legend_url(layer_name, wms_url):
+    """
+    Stream the capabilities document and return the first matching legend URL.
+
+    Uses iterparse over the raw response so only O(depth) of the XML is
+    held in memory, clearing layers as they are parsed and returning as
+    soon as the requested layer is seen.
 
     Parameters
     ----------
     layer_name : str
-        The GIBS layer identifier (e.g., 'OPERA_L3_DIST-ANN-HLS_Color_Index')
+        The layer name to look for
     wms_url : str
         The WMS endpoint URL
 
@@ -62,64 +194,122 @@ def get_gibs_legend_url(layer_name, wms_url="https://gibs.earthdata.nasa.gov/wms
     """
     capabilities_url = f"{wms_url}?SERVICE=WMS&REQUEST=GetCapabilities&VERSION=1.3.0"
 
-    response = requests.get(capabilities_url)
+    response = _session.get(capabilities_url, stream=True, timeout=(3, 15))
     response.raise_for_status()
+    response.raw.decode_content = True
+
+    wms = 'http://www.opengis.net/wms'
+    try:
+        for _, elem in ET.iterparse(response.raw, events=('end',)):
+            if elem.tag != f'{{{wms}}}Layer':
+                continue
+            name_elem = elem.find(f'{{{wms}}}Name')
+            if name_elem is not None and name_elem.text == layer_name:
+                legend_url_elem = elem.find(f'.//{{{wms}}}LegendURL/{{{wms}}}OnlineResource')
+                if legend_url_elem is not None:
+                    return legend_url_elem.get('{http://www.w3.org/1999/xlink}href')
+                return None
+            # Free the finished layer so memory stays bounded
+            elem.clear()
+    finally:
+        response.close()
 
-    # Parse XML
-    root = ET.fromstring(response.content)
+    return None
 
-    # Define namespace (WMS 1.3.0 uses this namespace)
-    ns = {'wms': 'http://www.opengis.net/wms'}
 
-    # Find the layer by name
-    for layer in root.findall('.//wms:Layer', ns):
-        name_elem = layer.find('wms:Name', ns)
-        if name_elem is not None and name_elem.text == layer_name:
-            # Look for LegendURL
-            legend_url_elem = layer.find('.//wms:LegendURL/wms:OnlineResource', ns)
-            if legend_url_elem is not None:
-                # Get the href attribute (uses xlink namespace)
-                href = legend_url_elem.get('{http://www.w3.org/1999/xlink}href')
-                return href
+def get_gibs_legend_url(layer_name, wms_url="https://gibs.earthdata.nasa.gov/wms/epsg3857/best/wms.cgi",
+                        use_cache=True):
+    """
+    Fetch the legend URL for a given NASA GIBS layer from WMS GetCapabilities.
 
-    return None
+    Parameters
+    ----------
+    layer_name : str
+        The GIBS layer identifier (e.g., 'OPERA_L3_DIST-ANN-HLS_Color_Index')
+    wms_url : str
+        The WMS endpoint URL
+    use_cache : bool
+        If True (default), fetch and parse the full capabilities document
+        once and answer lookups from a cached index. If False, stream the
+        document and stop at the first match, which avoids holding the
+        whole XML tree in memory for a one-off lookup.
+
+    Returns
+    -------
+    str or None
+        The legend URL if found, otherwise None
+    """
+    if not use_cache:
+        try:
+            return _stream_legend_url(layer_name, wms_url)
+        except _XMLParseError:
+            # Fall back to the DOM parse below if streaming fails
+            pass
+
+    root = _get_capabilities_root(wms_url)
+    return _build_legend_index(root).get(layer_name)
 
 
-class ToggleableLayerColorbar(MacroElement):
+def get_gibs_legend_urls(layer_names, wms_url="https://gibs.earthdata.nasa.gov/wms/epsg3857/best/wms.cgi"):
     """
-    A colorbar legend that toggles visibility based on layer add/remove events.
+    Resolve legend URLs for several GIBS layers with one capabilities fetch.
+
+    The capabilities document is fetched and indexed once, then every
+    layer is resolved in memory, so N lookups cost a single network
+    round-trip instead of stalling serially per layer.
+
+    Parameters
+    ----------
+    layer_names : iterable of str
+        The GIBS layer identifiers to look up
+    wms_url : str
+        The WMS endpoint URL
+
+    Returns
+    -------
+    dict
+        Mapping of layer name to legend URL (None for layers without one)
+    """
+    index = _build_legend_index(_get_capabilities_root(wms_url))
+    return {name: index.get(name) for name in layer_names}
+
+
+@functools.lru_cache(maxsize=64)
+def _render_colormap_html(colormap):
+    """
+    Render a branca colormap to HTML, caching per colormap object.
+
+    Maps reusing one colormap across many layers render its SVG once
+    instead of regenerating it for every legend instance.
+    """
+    return colormap._repr_html_()
+
+
+class ToggleableLegend(MacroElement):
+    """
+    A legend that toggles visibility based on layer add/remove events.
     Works with TreeLayerControl by tracking the layer object directly.
+
+    All legends share one JS registry, so showing a layer's legend hides
+    whichever legend was visible before it. Subclasses only differ in how
+    they build the legend body HTML.
     """
     _counter = 0  # Class-level counter for unique IDs
 
-    def __init__(self, layer, colormap):
-        """
-        Parameters
-        ----------
-        layer : folium layer object
-            The layer to associate with this colorbar (e.g., a TileLayer)
-        colormap : branca colormap
-            The colormap to display
-        """
-        super().__init__()
-        self.layer = layer
-        self.colormap = colormap
-        ToggleableLayerColorbar._counter += 1
-        self.legend_var_name = f"layer_legend_{ToggleableLayerColorbar._counter}"
-
-        self._template = Template("""
+    # Compiled once at import time; the template source is identical for
+    # every legend instance, so there is no need to re-parse it per legend.
+    _template = Template("""
         {% macro script(this, kwargs) %}
-        // Initialize registry if not exists
-        if (typeof window._layerColorbarLegends === 'undefined') {
-            window._layerColorbarLegends = {};
+        // Initialize shared registry if not exists
+        if (typeof window._layerLegends === 'undefined') {
+            window._layerLegends = {};
         }
 
         var {{ this.legend_var_name }} = L.control({position: 'bottomright'});
         {{ this.legend_var_name }}.onAdd = function (map) {
             var div = L.DomUtil.create('div', 'info legend');
-            div.style.backgroundColor = 'white';
-            div.style.padding = '10px';
-            div.innerHTML = `{{ this.colormap._repr_html_() }}`;
+            div.style.cssText = '{{ this.div_style }}';
+            div.innerHTML = `{{ this.body_html|safe }}`;
             return div;
         };
         // Don't add to map initially - will be added when layer is shown
@@ -129,7 +319,7 @@ class ToggleableLayerColorbar(MacroElement):
         var targetLayer_{{ this.legend_var_name }} = {{ this.layer.get_name() }};
 
         // Register this legend with the layer reference
-        window._layerColorbarLegends['{{ this.legend_var_name }}'] = {
+        window._layerLegends['{{ this.legend_var_name }}'] = {
             legend: {{ this.legend_var_name }},
             layer: targetLayer_{{ this.legend_var_name }}
         };
@@ -138,8 +328,8 @@ class ToggleableLayerColorbar(MacroElement):
         {{ this._parent.get_name() }}.on('layeradd', function(e) {
             if (e.layer === targetLayer_{{ this.legend_var_name }}) {
                 // Remove all other legends from the map first
-                for (var key in window._layerColorbarLegends) {
-                    var entry = window._layerColorbarLegends[key];
+                for (var key in window._layerLegends) {
+                    var entry = window._layerLegends[key];
                     if (entry.legend._isOnMap) {
                         entry.legend.remove();
                         entry.legend._isOnMap = false;
@@ -163,15 +353,57 @@ class ToggleableLayerColorbar(MacroElement):
         {% endmacro %}
         """)
 
+    def __init__(self, layer, body_html,
+                 div_style='background-color: white; padding: 10px;'):
+        """
+        Parameters
+        ----------
+        layer : folium layer object
+            The layer to associate with this legend (e.g., a TileLayer)
+        body_html : str
+            The HTML to display inside the legend control
+        div_style : str
+            Inline CSS applied to the legend container div
+        """
+        super().__init__()
+        self.layer = layer
+        self.body_html = body_html
+        self.div_style = div_style
+        ToggleableLegend._counter += 1
+        self.legend_var_name = f"layer_legend_{ToggleableLegend._counter}"
+
 
-class ToggleableEsriLegend(MacroElement):
+class ToggleableLayerColorbar(ToggleableLegend):
     """
-    A legend that toggles visibility based on layer add/remove events.
-    Builds HTML legend from ESRI MapServer legend JSON response.
+    A colorbar legend that toggles visibility based on layer add/remove events.
+    """
+
+    def __init__(self, layer, colormap):
+        """
+        Parameters
+        ----------
+        layer : folium layer object
+            The layer to associate with this colorbar (e.g., a TileLayer)
+        colormap : branca colormap
+            The colormap to display
+        """
+        self.colormap = colormap
+        super().__init__(layer, _render_colormap_html(colormap))
+
+
+# Static CSS for ESRI legend entries, hoisted so the loop below only
+# interpolates the per-item values.
+_ESRI_ITEM_STYLE = 'display: flex; align-items: center; margin: 2px 0;'
+_ESRI_SWATCH_STYLE = 'width: 20px; height: 20px; margin-right: 5px;'
+_ESRI_LABEL_STYLE = 'font-size: 12px;'
+
+
+class ToggleableEsriLegend(ToggleableLegend):
+    """
+    A legend built from an ESRI MapServer legend JSON response.
     """
-    _counter = 0
 
-    def __init__(self, layer, legend_json, title="Legend"):
+    def __init__(self, layer, legend_json, title="Legend", assets_dir=None):
         """
         Parameters
         ----------
@@ -181,193 +413,109 @@ class ToggleableEsriLegend(MacroElement):
             The JSON response from ESRI MapServer legend endpoint
         title : str
             Title to display at the top of the legend
+        assets_dir : str, optional
+            Directory (relative to the saved map HTML) in which to write
+            swatch images. When given, base64 imageData is decoded to
+            content-addressed files and referenced by path, keeping the
+            images out of the page HTML. Without it, swatches fall back
+            to inline data URIs.
         """
-        super().__init__()
-        self.layer = layer
         self.legend_json = legend_json
         self.title = title
-        ToggleableEsriLegend._counter += 1
-        self.legend_var_name = f"esri_legend_{ToggleableEsriLegend._counter}"
-
-        # Build the legend HTML from the JSON
+        self.assets_dir = assets_dir
         self.legend_html = self._build_legend_html()
+        super().__init__(
+            layer, self.legend_html,
+            div_style=('background-color: white; padding: 10px; '
+                       'max-height: 300px; overflow-y: auto;'))
 
-        self._template = Template("""
-        {% macro script(this, kwargs) %}
-        // Initialize registry if not exists
-        if (typeof window._layerEsriLegends === 'undefined') {
-            window._layerEsriLegends = {};
-        }
-
-        var {{ this.legend_var_name }} = L.control({position: 'bottomright'});
-        {{ this.legend_var_name }}.onAdd = function (map) {
-            var div = L.DomUtil.create('div', 'info legend');
-            div.style.backgroundColor = 'white';
-            div.style.padding = '10px';
-            div.style.maxHeight = '300px';
-            div.style.overflowY = 'auto';
-            div.innerHTML = `{{ this.legend_html }}`;
-            return div;
-        };
-        {{ this.legend_var_name }}._isOnMap = false;
+    def _image_src(self, item):
+        """Resolve the <img> src for one legend item, preferring references.
 
-        var targetLayer_{{ this.legend_var_name }} = {{ this.layer.get_name() }};
-
-        window._layerEsriLegends['{{ this.legend_var_name }}'] = {
-            legend: {{ this.legend_var_name }},
-            layer: targetLayer_{{ this.legend_var_name }}
-        };
-
-        {{ this._parent.get_name() }}.on('layeradd', function(e) {
-            if (e.layer === targetLayer_{{ this.legend_var_name }}) {
-                // Remove all colorbar legends first
-                if (typeof window._layerColorbarLegends !== 'undefined') {
-                    for (var key in window._layerColorbarLegends) {
-                        var entry = window._layerColorbarLegends[key];
-                        if (entry.legend._isOnMap) {
-                            entry.legend.remove();
-                            entry.legend._isOnMap = false;
-                        }
-                    }
-                }
-                // Remove all ESRI legends
-                for (var key in window._layerEsriLegends) {
-                    var entry = window._layerEsriLegends[key];
-                    if (entry.legend._isOnMap) {
-                        entry.legend.remove();
-                        entry.legend._isOnMap = false;
-                    }
-                }
-                {{ this.legend_var_name }}.addTo({{ this._parent.get_name() }});
-                {{ this.legend_var_name }}._isOnMap = true;
-            }
-        });
-
-        {{ this._parent.get_name() }}.on('layerremove', function(e) {
-            if (e.layer === targetLayer_{{ this.legend_var_name }}) {
-                if ({{ this.legend_var_name }}._isOnMap) {
-                    {{ this.legend_var_name }}.remove();
-                    {{ this.legend_var_name }}._isOnMap = false;
-                }
-            }
-        });
-        {% endmacro %}
-        """)
+        A plain URL beats shipping the image bytes in the page; inlining
+        base64 grows the HTML by ~4/3x the image size per swatch.
+        """
+        url = item.get('url')
+        if url:
+            return url
+
+        image_data = item.get('imageData') or ''
+        content_type = item.get('contentType', 'image/png')
+
+        if self.assets_dir and image_data:
+            raw = base64.b64decode(image_data)
+            ext = content_type.rsplit('/', 1)[-1]
+            fname = f"{hashlib.sha1(raw).hexdigest()}.{ext}"
+            os.makedirs(self.assets_dir, exist_ok=True)
+            path = os.path.join(self.assets_dir, fname)
+            if not os.path.exists(path):
+                with open(path, 'wb') as f:
+                    f.write(raw)
+            return f"{self.assets_dir.rstrip('/')}/{fname}"
+
+        return f"data:{content_type};base64,{image_data}"
 
     def _build_legend_html(self):
         """Build HTML string from ESRI legend JSON."""
-        html = f'<b>{self.title}</b><br>'
+        # Stream entries into a StringIO buffer (O(n), unlike += which
+        # reallocates the growing string each iteration). The caller's
+        # legend_json is left untouched so it can back further legends.
+        buf = io.StringIO()
+        buf.write(f'<b>{escape(self.title)}</b><br>')
 
         if 'layers' in self.legend_json and len(self.legend_json['layers']) > 0:
             legend_items = self.legend_json['layers'][0].get('legend', [])
             for item in legend_items:
                 label = item.get('label', '')
-                image_data = item.get('imageData', '')
-                content_type = item.get('contentType', 'image/png')
 
-                html += f'''
-                <div style="display: flex; align-items: center; margin: 2px 0;">
-                    <img src="data:{content_type};base64,{image_data}"
-                         style="width: 20px; height: 20px; margin-right: 5px;"/>
-                    <span style="font-size: 12px;">{label}</span>
-                </div>'''
+                buf.write(f'''
+                <div style="{_ESRI_ITEM_STYLE}">
+                    <img src="{self._image_src(item)}"
+                         style="{_ESRI_SWATCH_STYLE}"/>
+                    <span style="{_ESRI_LABEL_STYLE}">{escape(label)}</span>
+                </div>''')
 
-        return html
+        return buf.getvalue()
 
 
-class ToggleableGIBSLegend(MacroElement):
+def _swap_png_for_svg(url):
+    """Rewrite a .png extension on the URL path's final segment to .svg.
+
+    Only the filename extension is touched, so URLs that merely contain
+    '.png' elsewhere (query strings, directory names) pass through intact.
     """
-    A legend that toggles visibility based on layer add/remove events.
-    Displays a NASA GIBS legend image from their legend URL.
+    parts = urllib.parse.urlsplit(url)
+    path = re.sub(r'\.png$', '.svg', parts.path, flags=re.IGNORECASE)
+    return urllib.parse.urlunsplit(parts._replace(path=path))
+
+
+class ToggleableGIBSLegend(ToggleableLegend):
+    """
+    A legend that displays a NASA GIBS legend image from their legend URL.
     """
-    _counter = 0
 
-    def __init__(self, layer, legend_url, title="Legend"):
+    def __init__(self, layer, legend_url, title="Legend", prefer_svg=False):
         """
         Parameters
         ----------
         layer : folium layer object
             The layer to associate with this legend
         legend_url : str
-            The URL to the GIBS legend image (SVG or PNG)
+            The URL to the GIBS legend image (SVG or PNG), used as-is by
+            default (GetCapabilities already advertises the format)
         title : str
             Title to display at the top of the legend
+        prefer_svg : bool
+            If True, rewrite a .png filename in the URL path to .svg
         """
-        super().__init__()
-        self.layer = layer
-        # Convert PNG URL to SVG if needed
-        self.legend_url = legend_url.replace('.png', '.svg') if legend_url else legend_url
+        if legend_url and prefer_svg:
+            legend_url = _swap_png_for_svg(legend_url)
+        self.legend_url = legend_url
         self.title = title
-        ToggleableGIBSLegend._counter += 1
-        self.legend_var_name = f"gibs_legend_{ToggleableGIBSLegend._counter}"
-
-        self._template = Template("""
-        {% macro script(this, kwargs) %}
-        // Initialize registry if not exists
-        if (typeof window._layerGIBSLegends === 'undefined') {
-            window._layerGIBSLegends = {};
-        }
-
-        var {{ this.legend_var_name }} = L.control({position: 'bottomright'});
-        {{ this.legend_var_name }}.onAdd = function (map) {
-            var div = L.DomUtil.create('div', 'info legend');
-            div.style.backgroundColor = 'white';
-            div.style.padding = '6px';
-            div.style.maxWidth = '200px';
-            div.innerHTML = `<b style="font-size:11px;">{{ this.title }}</b><br><img src="{{ this.legend_url }}" style="max-width:100%;height:auto;"/>`;
-            return div;
-        };
-        {{ this.legend_var_name }}._isOnMap = false;
-
-        var targetLayer_{{ this.legend_var_name }} = {{ this.layer.get_name() }};
-
-        window._layerGIBSLegends['{{ this.legend_var_name }}'] = {
-            legend: {{ this.legend_var_name }},
-            layer: targetLayer_{{ this.legend_var_name }}
-        };
-
-        {{ this._parent.get_name() }}.on('layeradd', function(e) {
-            if (e.layer === targetLayer_{{ this.legend_var_name }}) {
-                // Remove all colorbar legends first
-                if (typeof window._layerColorbarLegends !== 'undefined') {
-                    for (var key in window._layerColorbarLegends) {
-                        var entry = window._layerColorbarLegends[key];
-                        if (entry.legend._isOnMap) {
-                            entry.legend.remove();
-                            entry.legend._isOnMap = false;
-                        }
-                    }
-                }
-                // Remove all ESRI legends
-                if (typeof window._layerEsriLegends !== 'undefined') {
-                    for (var key in window._layerEsriLegends) {
-                        var entry = window._layerEsriLegends[key];
-                        if (entry.legend._isOnMap) {
-                            entry.legend.remove();
-                            entry.legend._isOnMap = false;
-                        }
-                    }
-                }
-                // Remove all GIBS legends
-                for (var key in window._layerGIBSLegends) {
-                    var entry = window._layerGIBSLegends[key];
-                    if (entry.legend._isOnMap) {
-                        entry.legend.remove();
-                        entry.legend._isOnMap = false;
-                    }
-                }
-                {{ this.legend_var_name }}.addTo({{ this._parent.get_name() }});
-                {{ this.legend_var_name }}._isOnMap = true;
-            }
-        });
-
-        {{ this._parent.get_name() }}.on('layerremove', function(e) {
-            if (e.layer === targetLayer_{{ this.legend_var_name }}) {
-                if ({{ this.legend_var_name }}._isOnMap) {
-                    {{ this.legend_var_name }}.remove();
-                    {{ this.legend_var_name }}._isOnMap = false;
-                }
-            }
-        });
-        {% endmacro %}
-        """)
+        body_html = (
+            f'<b style="font-size:11px;">{escape(title)}</b><br>'
+            f'<img src="{self.legend_url}" style="max-width:100%;height:auto;"/>'
+        )
+        super().__init__(
+            layer, body_html,
+            div_style='background-color: white; padding: 6px; max-width: 200px;')